@@ -1,6 +1,18 @@
+import functools
+import io
+import math
+
 import numpy as np
-import matplotlib.pyplot as plt
+import pandas as pd
 import streamlit as st
+from PIL import Image, ImageDraw, ImageFont
+
+MAX_TESTS = 10  # Upper bound of the "Number of tests" slider
+NUM_DOTS = 15000  # Massive increase from 2000 - extremely dense background
+PLATE_SIZE = 512  # Plate is rasterized to a PLATE_SIZE x PLATE_SIZE image
+# Pixel radius of each stamped dot. The original s=15 scatter dots were ~0.0069 of the plate width
+DOT_RADIUS = round(PLATE_SIZE * 0.0069)
+LAYOUT_SEED = 109  # Dot positions are the same for every test; only colors change
 
 # --------------------------
 # SESSION STATE
@@ -10,31 +22,111 @@ if "initialized" not in st.session_state:
     st.session_state.prior = None
     st.session_state.num_tests = 5  # Default number of tests
     st.session_state.test_num = 0
-    st.session_state.results = []  # 1 for correct, 0 for wrong
-    st.session_state.likelihoods_cb = []
-    st.session_state.likelihoods_not_cb = []
-    st.session_state.posterior_history = []
+    # Per-test record, preallocated for the largest test count and indexed by test_num
+    st.session_state.results = np.zeros(MAX_TESTS, np.int8)  # 1 for correct, 0 for wrong
+    st.session_state.pcb = np.zeros(MAX_TESTS, np.float32)   # P(correct) if colorblind
+    st.session_state.pncb = np.zeros(MAX_TESTS, np.float32)  # P(correct) if NOT colorblind
+    st.session_state.log_lcb = 0.0   # Running log-likelihood of all answers if colorblind
+    st.session_state.log_lncb = 0.0  # Running log-likelihood of all answers if NOT colorblind
+    st.session_state.posterior_history = None  # Preallocated when testing starts
+    st.session_state.ph_len = 0                 # Number of filled posterior_history entries
 
 # --------------------------
 # HELPER FUNCTIONS
 # --------------------------
-def calculate_posterior(prior, results, likelihoods_cb, likelihoods_not_cb):
-    """Calculate posterior by multiplying all likelihoods"""
-    likelihood_cb = 1.0
-    likelihood_not_cb = 1.0
-    
-    for i in range(len(results)):
-        if results[i] == 1:  # Correct
-            likelihood_cb *= likelihoods_cb[i]
-            likelihood_not_cb *= likelihoods_not_cb[i]
-        else:  # Wrong
-            likelihood_cb *= (1 - likelihoods_cb[i])
-            likelihood_not_cb *= (1 - likelihoods_not_cb[i])
-    
-    numerator = prior * likelihood_cb
-    denominator = numerator + (1 - prior) * likelihood_not_cb
-    
-    return numerator / denominator if denominator > 0 else prior
+@functools.lru_cache(maxsize=None)
+def _plt():
+    """Import pyplot on first use so app start doesn't pay for it"""
+    import matplotlib.pyplot as plt
+    return plt
+
+@st.cache_resource
+def _plate_skeleton():
+    """Build the per-process pieces every plate shares: blank canvas, dot layout, font"""
+    canvas = np.full((PLATE_SIZE, PLATE_SIZE, 3), 255, np.uint8)
+
+    # Fixed dot centers in pixel coordinates (image rows grow downwards)
+    dot_xy = np.random.default_rng(LAYOUT_SEED).random((NUM_DOTS, 2), dtype=np.float32)
+    ix = np.minimum((dot_xy[:, 0] * PLATE_SIZE).astype(np.int32), PLATE_SIZE - 1)
+    iy = np.minimum(((1 - dot_xy[:, 1]) * PLATE_SIZE).astype(np.int32), PLATE_SIZE - 1)
+
+    # Flat canvas index of every pixel of every disk-shaped dot, one row per stamp offset
+    r = DOT_RADIUS
+    dot_pixels = np.stack([
+        np.clip(iy + dy, 0, PLATE_SIZE - 1) * PLATE_SIZE + np.clip(ix + dx, 0, PLATE_SIZE - 1)
+        for dy in range(-r, r + 1) for dx in range(-r, r + 1)
+        if dx * dx + dy * dy <= r * r
+    ])
+
+    # fontsize=60 was ~83 px inside the ~387 px axes of the original figure, i.e. 0.215 of the plate
+    font = ImageFont.load_default(size=int(PLATE_SIZE * 0.215))
+
+    return canvas, dot_pixels, font
+
+@functools.lru_cache(maxsize=128)
+def _digit_mask(text):
+    """Alpha mask (0-1, already at 55% opacity) of the number, cropped to its bounding box"""
+    canvas, _, font = _plate_skeleton()
+    H, W = canvas.shape[:2]
+    mask = Image.new("L", (W, H), 0)
+    # Pillow's default font is a regular weight; a stroke gives it the original bold look
+    ImageDraw.Draw(mask).text((W / 2, H / 2), text, fill=255, font=font, anchor="mm",
+                              stroke_width=3, stroke_fill=255)
+    left, top, right, bottom = mask.getbbox()
+    alpha = np.asarray(mask.crop((left, top, right, bottom)), np.float32) / 255 * 0.55
+    return alpha, top, left
+
+def _rasterize_plate(dot_colors, number_color, correct_value):
+    """Draw the dots and the number straight into a PNG (no Matplotlib figure)"""
+    canvas, dot_pixels, _ = _plate_skeleton()
+    img = canvas.copy()
+    # Dots were drawn at 95% opacity over white
+    colors = (dot_colors * (0.95 * 255) + 0.05 * 255).astype(np.uint8)
+
+    # Stamp every dot as a small disk in one fancy-index write
+    img.reshape(-1, 3)[dot_pixels.ravel()] = np.tile(colors, (len(dot_pixels), 1))
+
+    # Alpha-blend the number over the dots, only inside its bounding box
+    alpha, top, left = _digit_mask(str(correct_value))
+    alpha = alpha[..., None]
+    region = img[top:top + alpha.shape[0], left:left + alpha.shape[1]]
+    region[:] = (region * (1 - alpha) + number_color * 255 * alpha).astype(np.uint8)
+
+    buf = io.BytesIO()
+    Image.fromarray(img).save(buf, format="PNG")
+    return buf.getvalue()
+
+def _history_fig():
+    """Build this session's posterior history figure once; renders only update the line data"""
+    if "history_fig" in st.session_state:
+        return st.session_state.history_fig
+
+    fig, ax = _plt().subplots(figsize=(8, 4))
+    line, = ax.plot([], [], marker='o', linewidth=2, markersize=8)
+    ax.set_xlabel("Test Number")
+    ax.set_ylabel("Probability of Colorblindness")
+    ax.set_title("Posterior Probability Update Over Tests")
+    ax.grid(True, alpha=0.3)
+
+    # Kept per session: a process-wide figure would let concurrent sessions overwrite each other's line
+    st.session_state.history_fig = (fig, ax, line)
+    return fig, ax, line
+
+@st.cache_data
+def _gen_test(test_num, prior_seed):
+    """Generate the dot colors and plate for a test (deterministic per test_num and prior)"""
+    # Use test number AND the prior for seed to get different numbers each time
+    rng = np.random.default_rng(test_num * 42 + int(prior_seed * 10000))
+
+    correct_value = int(rng.integers(0, 100))
+
+    # Dot positions are fixed (see _plate_skeleton); each test only draws new colors
+    dot_colors = rng.random((NUM_DOTS, 3), dtype=np.float32)
+    number_color = rng.random(3, dtype=np.float32)
+
+    plate_png = _rasterize_plate(dot_colors, number_color, correct_value)
+
+    return dot_colors, number_color, correct_value, plate_png
 
 # --------------------------
 # TITLE
@@ -67,12 +159,14 @@ if st.session_state.prior is None:
     st.info(f"Prior probability of colorblindness: **{prior:.1%}** ({prior:.4f})")
     
     st.subheader("Step 2: How many tests do you want to take?")
-    num_tests = st.slider("Number of tests:", min_value=3, max_value=10, value=5, step=1)
+    num_tests = st.slider("Number of tests:", min_value=3, max_value=MAX_TESTS, value=5, step=1)
     st.session_state.num_tests = num_tests
     
     if st.button("▶️ Start Testing"):
         st.session_state.prior = prior
-        st.session_state.posterior_history.append(prior)
+        st.session_state.posterior_history = np.empty(num_tests + 1)
+        st.session_state.posterior_history[0] = prior
+        st.session_state.ph_len = 1
         st.rerun()
     
     st.stop()
@@ -86,7 +180,7 @@ if st.session_state.test_num >= st.session_state.num_tests:
     st.success("🎉 All tests completed!")
     st.balloons()
     
-    current_posterior = st.session_state.posterior_history[-1]
+    current_posterior = st.session_state.posterior_history[st.session_state.ph_len - 1]
     if current_posterior < 0.01:
         st.info("Based on your performance, you are very likely **NOT colorblind**!")
     elif current_posterior < 0.05:
@@ -100,44 +194,47 @@ if st.session_state.test_num >= st.session_state.num_tests:
 
 st.subheader(f"Test #{st.session_state.test_num + 1} of {st.session_state.num_tests}")
 
-# Use test number AND a random component for seed to get different numbers each time
-np.random.seed(st.session_state.test_num * 42 + int(st.session_state.prior * 10000))
+# Generate each test's bundle once; every later rerun of that test only reads it back
+bundle_key = f"test_bundle_{st.session_state.test_num}"
+if bundle_key not in st.session_state:
+    dot_colors, number_color, correct_value, plate_png = _gen_test(
+        st.session_state.test_num, st.session_state.prior
+    )
 
-correct_value = np.random.randint(0, 100)
-num_dots = 15000  # Massive increase from 2000 - extremely dense background
+    # Calculate contrast
+    bg_brightness = dot_colors.mean(dtype=np.float32)
+    r, g, b = number_color
+    num_brightness = (r + g + b) / 3.0  # Plain arithmetic beats np.mean's dispatch on 3 values
+    contrast = abs(num_brightness - bg_brightness)
 
-x = np.random.rand(num_dots)
-y = np.random.rand(num_dots)
-dot_colors = np.random.rand(num_dots, 3)
-number_color = np.random.rand(3)
+    # Make tests progressively harder VERY slowly
+    difficulty_factor = 1.0 - (st.session_state.test_num * 0.04)  # Only 4% harder per test
+    difficulty_factor = max(difficulty_factor, 0.7)  # Keep minimum at 70% to maintain high uncertainty
+    contrast = contrast * difficulty_factor
 
-# Calculate contrast
-bg_brightness = np.mean(dot_colors)
-num_brightness = np.mean(number_color)
-contrast = abs(num_brightness - bg_brightness)
+    # Calculate likelihoods - MUCH closer together for gradual updates
+    p_correct_if_not_cb = min(0.45 + 0.25 * contrast, 0.70)  # 45-70% range
+    p_correct_if_cb = min(0.35 + 0.20 * contrast, 0.60)      # 35-60% range (only 10% difference!)
 
-# Make tests progressively harder VERY slowly
-difficulty_factor = 1.0 - (st.session_state.test_num * 0.04)  # Only 4% harder per test
-difficulty_factor = max(difficulty_factor, 0.7)  # Keep minimum at 70% to maintain high uncertainty
-contrast = contrast * difficulty_factor
+    st.session_state[bundle_key] = {
+        "plate_png": plate_png,
+        "correct_value": correct_value,
+        "contrast": contrast,
+        "p_cb": p_correct_if_cb,
+        "p_ncb": p_correct_if_not_cb,
+    }
 
-# Calculate likelihoods - MUCH closer together for gradual updates
-p_correct_if_not_cb = min(0.45 + 0.25 * contrast, 0.70)  # 45-70% range
-p_correct_if_cb = min(0.35 + 0.20 * contrast, 0.60)      # 35-60% range (only 10% difference!)
+bundle = st.session_state[bundle_key]
+plate_png = bundle["plate_png"]
+correct_value = bundle["correct_value"]
+contrast = bundle["contrast"]
+p_correct_if_cb = bundle["p_cb"]
+p_correct_if_not_cb = bundle["p_ncb"]
 
 # --------------------------
 # DISPLAY TEST
 # --------------------------
-fig, ax = plt.subplots(figsize=(5, 5))
-circle = plt.Circle((0.5, 0.5), 0.48, color="white", zorder=1)
-ax.add_patch(circle)
-ax.scatter(x, y, c=dot_colors, s=15, zorder=2, alpha=0.95)  # Much smaller dots for 15k dots
-ax.text(0.5, 0.5, str(correct_value), fontsize=60, ha='center', va='center',
-        color=number_color, weight='bold', zorder=3, alpha=0.55)  # Set to 55% opacity
-ax.set_xlim(0, 1)
-ax.set_ylim(0, 1)
-ax.axis('off')
-st.pyplot(fig)
+st.image(plate_png)
 
 st.write(f"**Test difficulty:** Contrast = {contrast:.3f}")
 st.write(f"- If NOT colorblind: {p_correct_if_not_cb:.1%} chance of correct answer")
@@ -149,25 +246,33 @@ st.write(f"- If colorblind: {p_correct_if_cb:.1%} chance of correct answer")
 user_guess = st.text_input("What number do you see?", key=f"input_{st.session_state.test_num}")
 
 if st.button("Submit Answer"):
-    if not user_guess.isdigit():
+    answer = user_guess.strip()
+    if not answer.isdecimal():
         st.error("Please enter a valid number!")
     else:
-        guess = int(user_guess)
+        guess = int(answer)
         is_correct = (guess == correct_value)
         
         # Store result
-        st.session_state.results.append(1 if is_correct else 0)
-        st.session_state.likelihoods_cb.append(p_correct_if_cb)
-        st.session_state.likelihoods_not_cb.append(p_correct_if_not_cb)
+        n = st.session_state.test_num
+        st.session_state.results[n] = int(is_correct)
+        st.session_state.pcb[n] = p_correct_if_cb
+        st.session_state.pncb[n] = p_correct_if_not_cb
+        
+        # Add this test's log-likelihoods to the running totals (O(1) per test)
+        if is_correct:
+            st.session_state.log_lcb += math.log(p_correct_if_cb)
+            st.session_state.log_lncb += math.log(p_correct_if_not_cb)
+        else:
+            st.session_state.log_lcb += math.log1p(-p_correct_if_cb)
+            st.session_state.log_lncb += math.log1p(-p_correct_if_not_cb)
         
-        # Calculate new posterior
-        posterior = calculate_posterior(
-            st.session_state.prior,
-            st.session_state.results,
-            st.session_state.likelihoods_cb,
-            st.session_state.likelihoods_not_cb
-        )
-        st.session_state.posterior_history.append(posterior)
+        # Calculate new posterior from the summed log-likelihoods
+        log_num = math.log(st.session_state.prior) + st.session_state.log_lcb
+        log_den = np.logaddexp(log_num, math.log1p(-st.session_state.prior) + st.session_state.log_lncb)
+        posterior = float(np.exp(log_num - log_den))
+        st.session_state.posterior_history[st.session_state.ph_len] = posterior
+        st.session_state.ph_len += 1
         st.session_state.test_num += 1
         
         # Show result
@@ -178,9 +283,10 @@ if st.button("Submit Answer"):
         
         st.write("---")
         st.write("**📊 Bayesian Update:**")
-        st.write(f"- Prior (before this test): {st.session_state.posterior_history[-2]:.6f}")
+        previous = st.session_state.posterior_history[st.session_state.ph_len - 2]
+        st.write(f"- Prior (before this test): {previous:.6f}")
         st.write(f"- Posterior (after this test): {posterior:.6f}")
-        st.write(f"- Change: {posterior - st.session_state.posterior_history[-2]:+.6f}")
+        st.write(f"- Change: {posterior - previous:+.6f}")
         
         if is_correct:
             st.write(f"✓ Since you were correct and non-colorblind people are more likely to be correct ({p_correct_if_not_cb:.1%} vs {p_correct_if_cb:.1%}), your probability of being colorblind should **decrease**.")
@@ -203,7 +309,8 @@ st.divider()
 st.subheader("📈 Current Results")
 
 if st.session_state.test_num > 0:
-    current_posterior = st.session_state.posterior_history[-1]
+    history = st.session_state.posterior_history[:st.session_state.ph_len]
+    current_posterior = history[-1]
     st.metric(
         label="Current Probability of Colorblindness",
         value=f"{current_posterior:.4%}",
@@ -211,23 +318,30 @@ if st.session_state.test_num > 0:
     )
     
     # Plot posterior history
-    if len(st.session_state.posterior_history) > 1:
-        fig, ax = plt.subplots(figsize=(8, 4))
-        ax.plot(range(len(st.session_state.posterior_history)), 
-                st.session_state.posterior_history, 
-                marker='o', linewidth=2, markersize=8)
-        ax.set_xlabel("Test Number")
-        ax.set_ylabel("Probability of Colorblindness")
-        ax.set_title("Posterior Probability Update Over Tests")
-        ax.grid(True, alpha=0.3)
-        ax.set_ylim(0, max(st.session_state.posterior_history) * 1.2)
+    if len(history) > 1:
+        fig, ax, line = _history_fig()
+        line.set_data(range(len(history)), history)
+        ax.set_xlim(-0.5, len(history) - 0.5)
+        ax.set_ylim(0, history.max() * 1.2)
         st.pyplot(fig)
     
     # Test history
     st.write("### Test History")
-    for i in range(len(st.session_state.results)):
-        result = "✅ Correct" if st.session_state.results[i] == 1 else "❌ Wrong"
-        st.write(f"**Test {i+1}**: {result} | "
-                f"P(colorblind): {st.session_state.posterior_history[i]:.6f} → {st.session_state.posterior_history[i+1]:.6f}")
+    n = st.session_state.test_num
+    history_df = pd.DataFrame({
+        "Test": np.arange(1, n + 1),
+        "Result": np.where(st.session_state.results[:n].astype(bool), "✅ Correct", "❌ Wrong"),
+        "P(correct) if NOT colorblind": st.session_state.pncb[:n],
+        "P(correct) if colorblind": st.session_state.pcb[:n],
+        "P(colorblind) before": history[:-1],
+        "P(colorblind) after": history[1:],
+    })
+    st.dataframe(history_df, hide_index=True,
+                 column_config={
+                     "P(correct) if NOT colorblind": st.column_config.NumberColumn(format="%.3f"),
+                     "P(correct) if colorblind": st.column_config.NumberColumn(format="%.3f"),
+                     "P(colorblind) before": st.column_config.NumberColumn(format="%.6f"),
+                     "P(colorblind) after": st.column_config.NumberColumn(format="%.6f"),
+                 })
 
 st.write(f"**Tests completed:** {st.session_state.test_num} / {st.session_state.num_tests}")